@@ -1,43 +1,237 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
 from datetime import datetime, timedelta
-from typing import List, Dict, Callable, Optional, Union, Generator
+from typing import List, Dict, Callable, Optional, Pattern, Tuple, Union, Generator
 import re
 import time
 import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import chain
 from urllib.parse import urlencode
 import logging
 
+from utils import JobRecord, parse_retry_after
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SEARCH_URL = "https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search"
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+# Extra headers sent with search result requests only
+SEARCH_HEADERS = {'Referer': 'https://www.linkedin.com/'}
+
+# Maximum number of job description pages fetched at the same time
+DESCRIPTION_WORKERS = 8
+
+# Request pacing shared by every LinkedIn request; the rate halves whenever
+# LinkedIn throttles us and creeps back up after each successful response
+REQUESTS_PER_SECOND = 4.0
+MIN_REQUESTS_PER_SECOND = 0.25
+RATE_RECOVERY_STEP = 0.1
+MAX_REQUEST_ATTEMPTS = 5
+
+# Back-off between attempts at a search page that keeps failing
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+# Shared session so every request reuses pooled keep-alive connections.
+# 429 responses are left to the rate limiter so all workers slow down together.
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+))
+
+# Job cards on a search results page and the fields read from each card
+CARD_SELECTOR = 'div:is(.base-card, .job-search-card)'
+TITLE_SELECTOR = ':is(h3, h4):is(.base-search-card__title, .job-search-card__title)'
+COMPANY_SELECTOR = ':is(h4, h5):is(.base-search-card__subtitle, .job-search-card__subtitle)'
+LOCATION_SELECTOR = 'span:is(.job-search-card__location, .job-result-card__location)'
+TIME_SELECTOR = 'time:is(.job-search-card__listdate, .job-result-card__listdate)'
+LINK_SELECTOR = 'a:is(.base-card__full-link, .job-card-container__link)'
+
+# Known job description containers, matched in a single selector pass
+DESCRIPTION_SELECTOR = 'div.description__text, div.show-more-less-html__markup, div.job-description, div.description'
+DESCRIPTION_KEYWORDS = ('job description', 'position description', 'role description')
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential back-off with jitter for the given attempt number"""
+    return min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX) + random.uniform(0, 1)
+
+class RateLimiter:
+    """
+    Thread-safe token bucket that adapts its rate to the server's throttling signals
+    """
+    def __init__(self, rate: float, burst: int, min_rate: float):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def update(self, response: requests.Response) -> None:
+        """Adjust the pace from a response's status and rate-limit headers"""
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        with self.lock:
+            if response.status_code == 429 or retry_after:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = 0.0
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                logger.info(f"Throttled by LinkedIn, slowing down to {self.rate:.2f} requests/s")
+            else:
+                self.rate = min(self.max_rate, self.rate + RATE_RECOVERY_STEP)
+                if response.headers.get('X-RateLimit-Remaining') == '0':
+                    self.tokens = 0.0
+
+RATE_LIMITER = RateLimiter(REQUESTS_PER_SECOND, burst=DESCRIPTION_WORKERS, min_rate=MIN_REQUESTS_PER_SECOND)
+
+def rate_limited_get(url: str, headers: Optional[Dict] = None) -> requests.Response:
+    """GET a LinkedIn URL at the shared pace, retrying while the server returns 429"""
+    for _ in range(MAX_REQUEST_ATTEMPTS):
+        RATE_LIMITER.acquire()
+        response = SESSION.get(url, headers=headers, timeout=10)
+        RATE_LIMITER.update(response)
+        if response.status_code != 429:
+            break
+    response.raise_for_status()
+    return response
+
 def parse_company_list(companies_text: str) -> set:
     """Parse company names from text input"""
     if not companies_text:
         return set()
-    return {company.strip().lower() for company in companies_text.split('\n') if company.strip()}
+    # Lowercase the whole text once and strip each line in a single C-level pass
+    companies = set(map(str.strip, companies_text.lower().splitlines()))
+    companies.discard('')
+    return companies
 
-def should_include_company(company: str, included_companies: set, excluded_companies: set) -> bool:
+def compile_company_filter(companies: set) -> Optional[Pattern]:
+    """
+    Compile company names into a single pattern matching any of them as a substring
+    """
+    if not companies:
+        return None
+    return re.compile('|'.join(map(re.escape, companies)))
+
+def should_include_company(company: str, included_pattern: Optional[Pattern], excluded_pattern: Optional[Pattern]) -> bool:
     """
     Determine if a job from a company should be included based on filters
     """
     company = company.lower()
     
     # Check excluded companies first
-    for excluded in excluded_companies:
-        if excluded in company:
-            return False
+    if excluded_pattern and excluded_pattern.search(company):
+        return False
     
     # If no included companies specified, include all (except excluded)
-    if not included_companies:
+    if not included_pattern:
         return True
     
     # Check if company matches any included company
-    for included in included_companies:
-        if included in company:
-            return True
-            
-    return False
+    return included_pattern.search(company) is not None
+
+def parse_job_cards(
+    html: Union[str, bytes],
+    default_location: str,
+    included: Optional[Pattern],
+    excluded: Optional[Pattern],
+    seen_urls: set,
+    limit: int
+) -> Tuple[List[JobRecord], int, int]:
+    """
+    Extracts up to `limit` new jobs from a page of search results.
+    Returns the jobs, the number of cards on the page and the number of cards
+    counted toward the search total (those not filtered out or already seen).
+    """
+    tree = LexborHTMLParser(html)
+    job_cards = tree.css(CARD_SELECTOR)
+    jobs = []
+    counted = 0
+
+    for card in job_cards:
+        try:
+            # Apply company filters before extracting anything else from the card
+            company_elem = card.css_first(COMPANY_SELECTOR)
+            if company_elem:
+                company = company_elem.text().strip()
+                if not should_include_company(company, included, excluded):
+                    continue
+
+            title_elem = card.css_first(TITLE_SELECTOR) if company_elem else None
+
+            if title_elem and company_elem:
+                link_elem = card.css_first(LINK_SELECTOR)
+                job_url = link_elem.attributes.get('href') if link_elem else None
+
+                # Overlapping result pages repeat postings; keep the first copy
+                if job_url:
+                    canonical_url = canonical_job_url(job_url)
+                    if canonical_url in seen_urls:
+                        continue
+                    seen_urls.add(canonical_url)
+
+                title = title_elem.text().strip()
+                location_elem = card.css_first(LOCATION_SELECTOR)
+                job_location = location_elem.text().strip() if location_elem else default_location
+
+                time_elem = card.css_first(TIME_SELECTOR)
+                posted_date = datetime.now() - timedelta(hours=random.randint(1, 24))
+                if time_elem:
+                    try:
+                        # LinkedIn sends plain dates; fromisoformat also accepts a 'Z' suffix
+                        posted_date = datetime.fromisoformat(time_elem.attributes.get('datetime'))
+                    except (TypeError, ValueError):
+                        pass
+
+                jobs.append(JobRecord(
+                    title=title,
+                    company=company,
+                    location=job_location,
+                    description=None,
+                    posted_date=posted_date,
+                    url=job_url
+                ))
+
+                if len(jobs) >= limit:
+                    logger.info("Reached maximum jobs limit")
+                    break
+
+            counted += 1
+
+        except Exception as e:
+            logger.error(f"Error processing job card: {str(e)}")
+            continue
+
+    return jobs, len(job_cards), counted
 
 def scrape_linkedin_jobs(
     location: str, 
@@ -47,128 +241,111 @@ def scrape_linkedin_jobs(
     progress_callback: Optional[Callable[[int], None]] = None,
     stream_jobs: bool = True,
     included_companies: str = "",
-    excluded_companies: str = ""
-) -> Union[List[Dict], Generator[Dict, None, None]]:
+    excluded_companies: str = "",
+    fetch_descriptions: bool = True
+) -> Union[List[JobRecord], Generator[JobRecord, None, None]]:
     """
-    Scrapes LinkedIn jobs based on given parameters
+    Scrapes LinkedIn jobs based on given parameters.
+    With fetch_descriptions=False, jobs with a URL are returned with a None description
+    so callers can fetch it on demand with get_job_description.
     """
-    # Parse company filters
-    included = parse_company_list(included_companies)
-    excluded = parse_company_list(excluded_companies)
+    # Parse company filters once into single-pass patterns
+    included = compile_company_filter(parse_company_list(included_companies))
+    excluded = compile_company_filter(parse_company_list(excluded_companies))
     
-    base_url = "https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search"
     jobs = []
+    seen_urls = set()
     total_jobs_found = 0
     filtered_count = 0
     start = 0
     max_jobs = 3000
 
+    # Construct request parameters; only the page offset changes per request
+    params = {
+        'keywords': role,
+        'location': location,
+        'distance': distance,
+        'sortBy': 'DD',
+        'start': start
+    }
+
+    if days is not None:
+        params['f_TPR'] = f'r{days * 86400}'
+
+    def search_page_url(page_start: int) -> str:
+        params['start'] = page_start
+        return f"{SEARCH_URL}?{urlencode(params)}"
+
     try:
-        while total_jobs_found < max_jobs:
-            # Construct request parameters
-            params = {
-                'keywords': role,
-                'location': location,
-                'distance': distance,
-                'sortBy': 'DD',
-                'start': start
-            }
-
-            if days is not None:
-                params['f_TPR'] = f'r{days * 86400}'
-
-            url = f"{base_url}?{urlencode(params)}"
-            logger.info(f"Fetching jobs batch starting at {start}")
-
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Referer': 'https://www.linkedin.com/',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1'
-            }
-
-            try:
-                response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.text, 'html.parser')
-                job_cards = soup.find_all('div', {'class': ['base-card', 'job-search-card']})
-
-                if not job_cards:
-                    logger.info("No more job cards found")
-                    break
+        # Search pages are fetched one at a time by a single producer thread,
+        # while job descriptions are fetched by a separate pool of workers
+        with ThreadPoolExecutor(max_workers=1) as page_pool, \
+                ThreadPoolExecutor(max_workers=DESCRIPTION_WORKERS) as pool:
+            url = search_page_url(start)
+            page = page_pool.submit(fetch_search_page, url)
+            page_attempts = 0
 
-                for card in job_cards:
-                    try:
-                        title_elem = card.find(['h3', 'h4'], {'class': ['base-search-card__title', 'job-search-card__title']})
-                        company_elem = card.find(['h4', 'h5'], {'class': ['base-search-card__subtitle', 'job-search-card__subtitle']})
-                        location_elem = card.find('span', {'class': ['job-search-card__location', 'job-result-card__location']})
-                        time_elem = card.find('time', {'class': ['job-search-card__listdate', 'job-result-card__listdate']})
-
-                        if title_elem and company_elem:
-                            company = company_elem.text.strip()
-                            
-                            # Apply company filters
-                            if not should_include_company(company, included, excluded):
-                                continue
-                                
-                            title = title_elem.text.strip()
-                            job_location = location_elem.text.strip() if location_elem else location
-
-                            link_elem = card.find('a', {'class': ['base-card__full-link', 'job-card-container__link']})
-                            job_url = link_elem.get('href') if link_elem else None
-
-                            description = get_job_description(job_url) if job_url else f"Position: {title}\nCompany: {company}\nLocation: {job_location}"
-
-                            posted_date = datetime.now() - timedelta(hours=random.randint(1, 24))
-                            if time_elem:
-                                try:
-                                    date_str = time_elem.get('datetime')
-                                    posted_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                                except:
-                                    pass
-
-                            job_data = {
-                                "title": title,
-                                "company": company,
-                                "location": job_location,
-                                "description": description,
-                                "posted_date": posted_date.strftime("%Y-%m-%d %H:%M:%S"),
-                                "url": job_url
-                            }
-
-                            filtered_count += 1
-                            
-                            if progress_callback:
-                                progress_callback(filtered_count)
-
-                            if stream_jobs:
-                                yield job_data
-                            else:
-                                jobs.append(job_data)
-
-                            if filtered_count >= max_jobs:
-                                logger.info("Reached maximum jobs limit")
-                                break
-
-                        total_jobs_found += 1
-
-                    except Exception as e:
-                        logger.error(f"Error processing job card: {str(e)}")
-                        continue
+            while total_jobs_found < max_jobs:
+                logger.info(f"Fetching jobs batch starting at {start}")
 
-                if filtered_count >= max_jobs:
-                    break
+                try:
+                    # Parsing happens inside parse_job_cards so the page and its tree are
+                    # released before jobs are handed out below
+                    batch, card_count, counted = parse_job_cards(
+                        page.result().content, location, included, excluded, seen_urls,
+                        limit=max_jobs - filtered_count
+                    )
+                    page_attempts = 0
+                    total_jobs_found += counted
+
+                    if not card_count:
+                        logger.info("No more job cards found")
+                        break
+
+                    # Queue every description fetch for this page
+                    pending = {}
+                    ready = []
+                    for job_data in batch:
+                        if not job_data.url:
+                            job_data.description = f"Position: {job_data.title}\nCompany: {job_data.company}\nLocation: {job_data.location}"
+                            ready.append(job_data)
+                        elif fetch_descriptions:
+                            pending[pool.submit(get_job_description, job_data.url)] = job_data
+                        else:
+                            ready.append(job_data)
+
+                    # Start fetching the next page while this page's descriptions resolve
+                    start += card_count
+                    if filtered_count + len(batch) < max_jobs:
+                        url = search_page_url(start)
+                        page = page_pool.submit(fetch_search_page, url)
+
+                    # Hand out jobs as soon as their descriptions arrive
+                    for job_data in chain(ready, with_descriptions(pending)):
+                        filtered_count += 1
 
-                start += len(job_cards)
-                time.sleep(random.uniform(2, 4))
+                        if progress_callback:
+                            progress_callback(filtered_count)
 
-            except requests.RequestException as e:
-                logger.error(f"Request error: {str(e)}")
-                time.sleep(random.uniform(5, 10))
-                continue
+                        if stream_jobs:
+                            yield job_data
+                        else:
+                            jobs.append(job_data)
+
+                    if filtered_count >= max_jobs:
+                        break
+
+                except requests.RequestException as e:
+                    page_attempts += 1
+                    if page_attempts >= MAX_REQUEST_ATTEMPTS:
+                        logger.error(f"Request error: {str(e)}; giving up after {page_attempts} attempts")
+                        break
+
+                    delay = backoff_delay(page_attempts)
+                    logger.error(f"Request error: {str(e)}; retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    page = page_pool.submit(fetch_search_page, url)
+                    continue
 
     except Exception as e:
         logger.error(f"Error scraping jobs: {str(e)}")
@@ -183,49 +360,66 @@ def scrape_linkedin_jobs(
     else:
         return jobs if jobs else get_sample_jobs(role, location)
 
+def with_descriptions(pending: Dict[Future, JobRecord]) -> Generator[JobRecord, None, None]:
+    """Yield jobs as their description fetches complete"""
+    for future in as_completed(pending):
+        job_data = pending[future]
+        job_data.description = future.result()
+        yield job_data
+
+def fetch_search_page(url: str) -> requests.Response:
+    """Fetch one page of search results"""
+    return rate_limited_get(url, headers=SEARCH_HEADERS)
+
+def canonical_job_url(url: str) -> str:
+    """Strip tracking query parameters so each posting maps to a single URL"""
+    return url.split('?', 1)[0]
+
+@lru_cache(maxsize=4096)
+def fetch_job_description(url: str) -> str:
+    """
+    Fetch and extract a job description, caching successful lookups by URL.
+    Raises LookupError when the page has no recognizable description.
+    """
+    response = rate_limited_get(url)
+    
+    # Parse the raw body, skipping requests' str decoding; Lexbor reads bytes as
+    # UTF-8 whatever charset the page declares, which holds for LinkedIn
+    tree = LexborHTMLParser(response.content)
+    
+    description_elem = tree.css_first(DESCRIPTION_SELECTOR)
+    if description_elem:
+        return description_elem.text().strip()
+            
+    # Render the page text once and only walk the tree for keywords it contains.
+    # A keyword may appear only outside the body (e.g. in <title>), so keep
+    # trying the next one until a div or section matches.
+    page_text = tree.root.text().lower()
+    for keyword in DESCRIPTION_KEYWORDS:
+        if keyword not in page_text:
+            continue
+        for desc_elem in tree.css('div, section'):
+            text = desc_elem.text()
+            if keyword in text.lower():
+                return text.strip()
+
+    raise LookupError("No job description found on page")
+
 def get_job_description(url: str) -> str:
     """Get detailed job description from job page"""
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        description_selectors = [
-            'div.description__text',
-            'div.show-more-less-html__markup',
-            'div.job-description',
-            'div.description'
-        ]
+        return fetch_job_description(canonical_job_url(url))
         
-        for selector in description_selectors:
-            description_elem = soup.select_one(selector)
-            if description_elem:
-                return description_elem.text.strip()
-                
-        description_keywords = ['job description', 'position description', 'role description']
-        for keyword in description_keywords:
-            desc_elem = soup.find(lambda tag: tag.name in ['div', 'section'] and 
-                                keyword.lower() in tag.text.lower())
-            if desc_elem:
-                return desc_elem.text.strip()
-                
-        time.sleep(random.uniform(1, 2))
+    except LookupError:
+        # The page has no recognizable description
+        pass
         
     except Exception as e:
         logger.error(f"Error fetching job description: {str(e)}")
     
     return "Detailed description not available"
 
-def get_sample_jobs(role: str, location: str) -> List[Dict]:
+def get_sample_jobs(role: str, location: str) -> List[JobRecord]:
     """Return sample jobs as fallback"""
     logger.info("Using sample jobs data as fallback")
     
@@ -256,13 +450,13 @@ def get_sample_jobs(role: str, location: str) -> List[Dict]:
     
     for i in range(5):
         hours_ago = random.randint(1, 24)
-        sample_jobs.append({
-            "title": job_titles[i],
-            "company": companies[i],
-            "location": location,
-            "description": descriptions[i],
-            "posted_date": (datetime.now() - timedelta(hours=hours_ago)).strftime("%Y-%m-%d %H:%M:%S"),
-            "url": None
-        })
+        sample_jobs.append(JobRecord(
+            title=job_titles[i],
+            company=companies[i],
+            location=location,
+            description=descriptions[i],
+            posted_date=datetime.now() - timedelta(hours=hours_ago),
+            url=None
+        ))
     
     return sample_jobs
\ No newline at end of file
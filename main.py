@@ -1,16 +1,33 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime, timedelta
 import io
+import hashlib
+import heapq
+import itertools
 import queue
+import statistics
 import threading
 import time
 import concurrent.futures
 
-from job_scraper import scrape_linkedin_jobs
+from job_scraper import scrape_linkedin_jobs, get_job_description, canonical_job_url, DESCRIPTION_WORKERS
 from resume_processor import extract_resume_text
-from matching_engine import analyze_matches
-from utils import export_to_csv
+from matching_engine import analyze_matches, JOBS_PER_REQUEST, MAX_CONCURRENT_ANALYSES
+from utils import export_to_csv, format_posted_date
+
+# Number of scraped jobs sent to the matching engine per call; enough to fill
+# every concurrent request the engine allows with a full group of jobs
+ANALYSIS_BATCH_SIZE = JOBS_PER_REQUEST * MAX_CONCURRENT_ANALYSES
+
+# Number of best matches shown in the live results panel
+TOP_MATCHES_COUNT = 5
+
+# Jobs are first scored without their description; only this many of the
+# best preliminary scores get their full description fetched and re-scored
+PROMOTION_CANDIDATES_COUNT = 10
+
+# Minimum seconds between live results redraws
+LIVE_RESULTS_INTERVAL = 0.3
 
 st.set_page_config(
     page_title="GenAI Job Matching",
@@ -51,11 +68,18 @@ class ProgressManager:
 
 class JobProcessor:
     """Handles parallel job processing"""
-    def __init__(self, resume_text, progress_mgr, results_container):
+    def __init__(self, resume_text, progress_mgr, results_container, use_opus=False):
         self.resume_text = resume_text
+        self.use_opus = use_opus
+        self.resume_hash = hashlib.blake2b(resume_text.encode(), digest_size=16).hexdigest()
         self.progress_mgr = progress_mgr
         self.results_container = results_container
         self.analyzed_jobs = []
+        self.top_heap = []  # min-heap of (match_score, -arrival, job)
+        self.promotion_heap = []  # min-heap of preliminary scores of promoted jobs
+        self.arrival_counter = itertools.count()
+        self.last_ui_update = 0.0
+        self.live_results_pending = False  # an update was skipped by the throttle
         self.lock = threading.Lock()
         self.search_count = 0
         self.analysis_count = 0
@@ -73,23 +97,23 @@ class JobProcessor:
                 st.markdown("### Live Results")
                 for idx, job in enumerate(st.session_state.top_matches, 1):
                     with st.expander(
-                        f"#{idx}: {job['title']} at {job['company']} - Match Score: {job['match_score']}%",
+                        f"#{idx}: {job.title} at {job.company} - Match Score: {job.match_score}%",
                         expanded=True
                     ):
                         col1, col2 = st.columns([2, 1])
                         with col1:
-                            st.write("**Company:** ", job['company'])
-                            st.write("**Location:** ", job['location'])
-                            st.write("**Posted:** ", job['posted_date'])
-                            if job['url']:
-                                st.write(f"**[Apply Here]({job['url']})**")
+                            st.write("**Company:** ", job.company)
+                            st.write("**Location:** ", job.location)
+                            st.write("**Posted:** ", format_posted_date(job.posted_date))
+                            if job.url:
+                                st.write(f"**[Apply Here]({job.url})**")
                         with col2:
                             st.metric(
                                 label="Match Score",
-                                value=f"{job['match_score']}%"
+                                value=f"{job.match_score}%"
                             )
                         st.write("**Match Analysis:**")
-                        st.write(job['match_reasoning'])
+                        st.write(job.match_reasoning)
 
     def handle_analyzed_job(self, job_with_match):
         """Handle each analyzed job"""
@@ -97,21 +121,125 @@ class JobProcessor:
             self.analyzed_jobs.append(job_with_match)
             self.analysis_count += 1
             
-            # Sort and get top matches
-            sorted_jobs = sorted(
-                self.analyzed_jobs,
-                key=lambda x: x.get('match_score', 0),
-                reverse=True
-            )
+            # Keep only the best matches; on equal scores earlier jobs rank first
+            entry = (job_with_match.match_score, -next(self.arrival_counter), job_with_match)
+            if len(self.top_heap) < TOP_MATCHES_COUNT:
+                heapq.heappush(self.top_heap, entry)
+            else:
+                heapq.heappushpop(self.top_heap, entry)
             
             # Update session state
-            st.session_state.top_matches = sorted_jobs[:5]
+            st.session_state.top_matches = [job for _, _, job in sorted(self.top_heap, reverse=True)]
             
             # Update progress - removed total_count parameter
             self.progress_mgr.update_analysis(self.analysis_count)
             
-            # Update live results display
-            self.display_live_results()
+            # Update live results display, at most once per interval
+            now = time.monotonic()
+            if now - self.last_ui_update >= LIVE_RESULTS_INTERVAL:
+                self.last_ui_update = now
+                self.live_results_pending = False
+                self.display_live_results()
+            else:
+                self.live_results_pending = True
+
+    def flush_live_results(self):
+        """Draw any live results update the throttle held back"""
+        with self.lock:
+            if self.live_results_pending:
+                self.last_ui_update = time.monotonic()
+                self.live_results_pending = False
+                self.display_live_results()
+
+    def should_promote(self, job):
+        """Check whether a job scored without its description ranks among the top candidates"""
+        if job.description is not None or not job.url:
+            return False
+        return self.claim_promotion_slot(job.match_score)
+
+    def claim_promotion_slot(self, score):
+        """Take one of the promotion slots if the score ranks among the best seen so far"""
+        if len(self.promotion_heap) < PROMOTION_CANDIDATES_COUNT:
+            heapq.heappush(self.promotion_heap, score)
+            return True
+        if score > self.promotion_heap[0]:
+            heapq.heapreplace(self.promotion_heap, score)
+            return True
+        return False
+
+    def analysis_cache_key(self, job):
+        """Identify a job's analysis for the current resume"""
+        job_key = canonical_job_url(job.url) if job.url else (job.title, job.company, job.location)
+        return (self.resume_hash, self.use_opus, job_key)
+
+    def load_cached_analysis(self, job):
+        """
+        Fill in a job's analysis from an earlier run in this session, returning whether one was found.
+        The matching engine's disk cache is the source of truth for scores; this per-session
+        cache only lets a rerun skip the preliminary pass and reuse fetched descriptions.
+        It lives as long as the browser session, so it needs no expiry of its own.
+        """
+        cached = st.session_state.analysis_cache.get(self.analysis_cache_key(job))
+        if not cached:
+            return False
+
+        job.match_score, job.match_reasoning, description = cached
+        job.description = job.description or description
+        return True
+
+    def cache_analysis(self, job):
+        """Remember a job's final analysis for later runs"""
+        # Failed analyses come back with a zero score; leave those to be retried.
+        # Preliminary scores made without a description are not final either: a later
+        # run must still get the chance to promote them (re-scoring them is served by
+        # the matching engine's disk cache).
+        if job.match_score and job.description is not None:
+            st.session_state.analysis_cache[self.analysis_cache_key(job)] = (
+                job.match_score, job.match_reasoning, job.description
+            )
+
+    def analyze_batch(self, jobs):
+        """Analyze a batch of jobs and handle each result"""
+        try:
+            self.analyze_batch_jobs(jobs)
+        finally:
+            # Catch up on results that arrived at the end of a burst
+            self.flush_live_results()
+
+    def analyze_batch_jobs(self, jobs):
+        """Score a batch, promoting the best description-less jobs for a second pass"""
+        # Reuse results from earlier runs with the same resume
+        uncached = []
+        for job in jobs:
+            if self.load_cached_analysis(job):
+                # Cached jobs with a URL were promoted before; they hold a slot again as in a fresh run
+                if job.url:
+                    self.claim_promotion_slot(job.match_score)
+                self.handle_analyzed_job(job)
+            else:
+                uncached.append(job)
+
+        if not uncached:
+            return
+
+        promoted = []
+        for analyzed_job in analyze_matches(self.resume_text, uncached, progress_callback=None, use_opus=self.use_opus):
+            if self.should_promote(analyzed_job):
+                promoted.append(analyzed_job)
+            else:
+                self.cache_analysis(analyzed_job)
+                self.handle_analyzed_job(analyzed_job)
+
+        if promoted:
+            # Fetch full descriptions for the promising jobs and score them again
+            with concurrent.futures.ThreadPoolExecutor(max_workers=DESCRIPTION_WORKERS) as pool:
+                descriptions = pool.map(get_job_description, [job.url for job in promoted])
+                for job, description in zip(promoted, descriptions):
+                    job.description = description
+
+            for analyzed_job in analyze_matches(self.resume_text, promoted, progress_callback=None, use_opus=self.use_opus):
+                self.cache_analysis(analyzed_job)
+                self.handle_analyzed_job(analyzed_job)
             
     def process_jobs(self, location, distance, role, days, included_companies="", excluded_companies=""):
         """Process jobs and display results in real-time"""
@@ -122,8 +250,12 @@ class JobProcessor:
             # Reset counters
             self.search_count = 0
             self.analysis_count = 0
+            self.top_heap = []
+            self.promotion_heap = []
+            self.last_ui_update = 0.0
             
-            # Process jobs
+            # Process jobs in batches
+            batch = []
             for job in scrape_linkedin_jobs(
                 location=location,
                 distance=distance,
@@ -132,7 +264,8 @@ class JobProcessor:
                 progress_callback=None,  # Disable the progress callback
                 stream_jobs=True,
                 included_companies=included_companies,
-                excluded_companies=excluded_companies
+                excluded_companies=excluded_companies,
+                fetch_descriptions=False  # Fetched later for top candidates only
             ):
                 if job:
                     # Update search count first
@@ -140,15 +273,17 @@ class JobProcessor:
                         self.search_count += 1
                         self.progress_mgr.update_job_search(self.search_count)
                     
-                    # Analyze job and update display
-                    analyzed_job = analyze_matches(
-                        self.resume_text,
-                        [job],
-                        progress_callback=None
-                    )[0]
-                    
-                    # Handle the analyzed job
-                    self.handle_analyzed_job(analyzed_job)
+                    batch.append(job)
+
+                    # Flush the first job on its own so results show up quickly
+                    batch_size = ANALYSIS_BATCH_SIZE if self.analysis_count else 1
+                    if len(batch) >= batch_size:
+                        self.analyze_batch(batch)
+                        batch = []
+
+            # Analyze whatever is left once the scraper is exhausted
+            if batch:
+                self.analyze_batch(batch)
 
             return self.analyzed_jobs if self.analyzed_jobs else []
 
@@ -156,6 +291,9 @@ class JobProcessor:
             st.error(f"Error in job processing: {str(e)}")
             return []
         finally:
+            # Render any final live results throttling held back
+            self.flush_live_results()
+
             # Clear progress displays when done
             self.progress_mgr.clear()
 
@@ -177,6 +315,8 @@ def initialize_session_state():
         st.session_state.current_job_number = 0
     if 'top_matches' not in st.session_state:
         st.session_state.top_matches = []
+    if 'analysis_cache' not in st.session_state:
+        st.session_state.analysis_cache = {}
 
 def display_top_matches(container):
     """Display current top 5 matches"""
@@ -184,76 +324,76 @@ def display_top_matches(container):
         container.markdown("### Current Top Matches")
         for idx, job in enumerate(st.session_state.top_matches, 1):
             with container.expander(
-                f"#{idx}: {job['title']} at {job['company']} - Match Score: {job['match_score']}%",
+                f"#{idx}: {job.title} at {job.company} - Match Score: {job.match_score}%",
                 expanded=True
             ):
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.write("**Company:** ", job['company'])
-                    st.write("**Location:** ", job['location'])
-                    st.write("**Posted:** ", job['posted_date'])
-                    if job['url']:
-                        st.write(f"**[Apply Here]({job['url']})**")
+                    st.write("**Company:** ", job.company)
+                    st.write("**Location:** ", job.location)
+                    st.write("**Posted:** ", format_posted_date(job.posted_date))
+                    if job.url:
+                        st.write(f"**[Apply Here]({job.url})**")
                 with col2:
                     st.metric(
                         label="Match Score",
-                        value=f"{job['match_score']}%"
+                        value=f"{job.match_score}%"
                     )
                 st.write("**Match Analysis:**")
-                st.write(job['match_reasoning'])
+                st.write(job.match_reasoning)
 
 def display_results(container):
     """Display final results after analysis is complete"""
     if 'matched_jobs' in st.session_state and st.session_state.analysis_complete:
-        matches_df = pd.DataFrame(st.session_state.matched_jobs)
+        matched_jobs = st.session_state.matched_jobs
 
         container.markdown("### Analysis Summary")
         col1, col2, col3 = container.columns(3)
         with col1:
             st.metric(
                 label="Total Jobs Found",
-                value=len(matches_df)
+                value=len(matched_jobs)
             )
         with col2:
-            avg_score = matches_df['match_score'].mean()
+            avg_score = statistics.fmean(job.match_score for job in matched_jobs) if matched_jobs else 0.0
             st.metric(
                 label="Average Match Score",
                 value=f"{avg_score:.1f}%"
             )
         with col3:
-            high_matches = len(matches_df[matches_df['match_score'] >= 80])
+            high_matches = sum(1 for job in matched_jobs if job.match_score >= 80)
             st.metric(
                 label="High Matches (≥80%)",
                 value=high_matches
             )
 
         container.markdown("### All Matches")
-        for idx, (_, job) in enumerate(matches_df.iterrows()):
+        for job in matched_jobs:
             with container.expander(
-                f"{job['title']} at {job['company']} - Match Score: {job['match_score']}%",
+                f"{job.title} at {job.company} - Match Score: {job.match_score}%",
                 expanded=False
             ):
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.write("**Company:** ", job['company'])
-                    st.write("**Location:** ", job['location'])
-                    st.write("**Posted:** ", job['posted_date'])
-                    if job.get('url'):
-                        st.write(f"**[Apply Here]({job['url']})**")
+                    st.write("**Company:** ", job.company)
+                    st.write("**Location:** ", job.location)
+                    st.write("**Posted:** ", format_posted_date(job.posted_date))
+                    if job.url:
+                        st.write(f"**[Apply Here]({job.url})**")
                 with col2:
                     st.metric(
                         label="Match Score",
-                        value=f"{job['match_score']}%"
+                        value=f"{job.match_score}%"
                     )
                 st.write("**Match Analysis:**")
-                st.write(job['match_reasoning'])
+                st.write(job.match_reasoning)
                 st.write("**Job Description:**")
-                st.write(job['description'])
+                st.write(job.description or "Full description was not fetched for this job")
 
         container.markdown("---")
         container.markdown("### Export Results")
         if container.button("Export to CSV", key="export_button", use_container_width=True):
-            csv = export_to_csv(matches_df)
+            csv = export_to_csv(matched_jobs)
             container.download_button(
                 label="Download CSV",
                 data=csv,
@@ -354,6 +494,12 @@ def main():
             key="resume_uploader"
         )
         
+        use_opus = st.checkbox(
+            "Detailed scoring",
+            help="Score with Claude Opus for higher quality; slower and more expensive",
+            key="use_opus"
+        )
+        
         search_button = st.button(
             "Find Matches", 
             type="primary", 
@@ -382,7 +528,7 @@ def main():
                 resume_text = extract_resume_text(uploaded_file)
 
             # Process jobs
-            processor = JobProcessor(resume_text, progress_mgr, results_container)
+            processor = JobProcessor(resume_text, progress_mgr, results_container, use_opus=use_opus)
             matched_jobs = processor.process_jobs(
                 location=location,
                 distance=distance,
@@ -421,20 +567,20 @@ def display_live_results(container):
         container.markdown("### Live Results")
         for idx, job in enumerate(st.session_state.top_matches, 1):
             with container.expander(
-                f"#{idx}: {job['title']} - {job['match_score']}% Match",
+                f"#{idx}: {job.title} - {job.match_score}% Match",
                 expanded=idx <= 3  # Only expand top 3
             ):
                 col1, col2 = st.columns([3, 1])
                 with col1:
-                    st.write(f"**Company:** {job['company']}")
-                    st.write(f"**Location:** {job['location']}")
-                    st.write(f"**Posted:** {job['posted_date']}")
+                    st.write(f"**Company:** {job.company}")
+                    st.write(f"**Location:** {job.location}")
+                    st.write(f"**Posted:** {format_posted_date(job.posted_date)}")
                 with col2:
                     st.metric(
                         label="Match",
-                        value=f"{job['match_score']}%"
+                        value=f"{job.match_score}%"
                     )
-                if job['url']:
+                if job.url:
                     st.button(
                         "Apply Now",
                         key=f"apply_{idx}",
@@ -442,7 +588,7 @@ def display_live_results(container):
                         type="primary"
                     )
                 st.write("**Match Analysis:**")
-                st.write(job['match_reasoning'])
+                st.write(job.match_reasoning)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,25 @@
 import anthropic
+import asyncio
+import hashlib
+import heapq
+import itertools
 import os
+import queue
+import re
+import sqlite3
 import sys
-from typing import List, Dict, Callable, Optional
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Any, List, Dict, Callable, Optional, Tuple
 import logging
 from dotenv import load_dotenv
+from tenacity import (
+    RetryCallState, retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+)
+
+from utils import JobRecord, parse_retry_after
 import time
-import random
 
 # Load environment variables
 load_dotenv()
@@ -13,42 +27,272 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def wait_with_backoff(retry_count: int) -> None:
-    """Implements exponential backoff with jitter"""
-    base_delay = 20  # Increased base delay to 20 seconds
-    max_delay = 120  # Maximum delay of 2 minutes
-    
-    delay = min(base_delay * (2 ** retry_count), max_delay)
-    jitter = random.uniform(0.5, 1.5)  # Add 50% jitter
-    final_delay = delay * jitter
-    
-    logger.info(f"Rate limit hit, waiting for {final_delay:.1f} seconds before retry...")
-    time.sleep(final_delay)
-
-def analyze_job_match(resume_text: str, job: Dict, client, retry_count: int = 0) -> Dict:
-    """Helper function to analyze a single job match with rate limiting"""
-    max_retries = 5  # Increased max retries
-    
+# Fast model used for scoring by default, and the slower one offered for maximum quality
+SCORING_MODEL = "claude-3-5-haiku-latest"
+OPUS_SCORING_MODEL = "claude-3-opus-20240229"
+
+# Shortest prompt prefix, in tokens, each model will cache. Haiku's minimum is above
+# RESUME_TOKEN_BUDGET, so in practice only the Opus path benefits from prompt caching.
+MIN_CACHEABLE_TOKENS = {SCORING_MODEL: 2048, OPUS_SCORING_MODEL: 1024}
+
+# Output budget per scored job; a "score|reasons" reply is only a few dozen tokens
+MAX_TOKENS_PER_JOB = 120
+
+# Attempts per Claude request, and which failures are retried
+MAX_REQUEST_ATTEMPTS = 6
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+# Back-off used when the server does not say how long to wait
+BACKOFF_WAIT = wait_random_exponential(min=1, max=60)
+
+# Upper bound on Claude requests in flight at once
+MAX_CONCURRENT_ANALYSES = 5
+
+# Jobs scored together in one request, so the resume is sent once per group
+JOBS_PER_REQUEST = 5
+
+# The number in the score part of a "[Score]|[Reasons]" reply, e.g. "85" or "**85**"
+SCORE_RE = re.compile(r'\d+')
+
+# One "[Job number]|[Score]|[Reasons]" line of a batched response
+BATCH_LINE_RE = re.compile(r'^\W*(\d+)\W*\|\W*(\d+)\W*\|\s*(.+?)\s*$', re.M)
+
+# Anthropic account limits (tier 1 defaults); requests are paced to stay within them
+REQUESTS_PER_MINUTE = 50
+INPUT_TOKENS_PER_MINUTE = 20000
+# Rough characters-per-token ratio used to estimate prompt sizes
+CHARS_PER_TOKEN = 4
+
+# Token budgets for the resume and each job description in a prompt
+RESUME_TOKEN_BUDGET = 1500
+DESCRIPTION_TOKEN_BUDGET = 1500
+
+class AsyncTokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` tokens a minute.
+    It is only touched from the analysis loop thread, so it needs no lock.
+    """
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until `amount` tokens are available and take them"""
+        amount = min(amount, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if now >= self.paused_until and self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep(max(self.paused_until - now, (amount - self.tokens) / self.rate))
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` and drain the bucket"""
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+REQUEST_BUCKET = AsyncTokenBucket(REQUESTS_PER_MINUTE)
+INPUT_TOKEN_BUCKET = AsyncTokenBucket(INPUT_TOKENS_PER_MINUTE)
+
+# Analyses are reused across sessions for the same resume and job content
+ANALYSIS_CACHE_PATH = os.getenv('ANALYSIS_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'job_matcher_cache.sqlite3'))
+# Seconds before a cached analysis expires, so model updates eventually take effect
+ANALYSIS_CACHE_TTL = 30 * 24 * 3600
+
+def update_digest(digest: Any, *parts: str) -> Any:
+    """Feed NUL-separated text parts into a hash and return it"""
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest
+
+def analysis_cache_key(prefix: 'PromptPrefix', job: JobRecord) -> str:
+    """Extend the run's model and resume hash with the job fields that make up the prompt"""
+    digest = prefix.cache_digest.copy()
+    return update_digest(digest, job.title, job.company, job.location, job.description or '').hexdigest()
+
+# Connection to the analysis cache, opened on first use and shared behind a lock
+ANALYSIS_CACHE: Optional[sqlite3.Connection] = None
+ANALYSIS_CACHE_LOCK = threading.Lock()
+
+def get_analysis_cache() -> sqlite3.Connection:
+    """
+    Open the analysis cache database once, creating its table and dropping expired entries.
+    Callers must hold ANALYSIS_CACHE_LOCK.
+    """
+    global ANALYSIS_CACHE
+    if ANALYSIS_CACHE is None:
+        conn = sqlite3.connect(ANALYSIS_CACHE_PATH, timeout=10, check_same_thread=False)
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses "
+                "(key TEXT PRIMARY KEY, created REAL, match_score INTEGER, match_reasoning TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS analyses_created ON analyses (created)")
+            conn.execute("DELETE FROM analyses WHERE created <= ?", (time.time() - ANALYSIS_CACHE_TTL,))
+        ANALYSIS_CACHE = conn
+    return ANALYSIS_CACHE
+
+def load_cached_analysis(key: str) -> Optional[Tuple[int, str]]:
+    """Return a cached (score, reasoning) pair that has not expired"""
     try:
-        logger.info(f"Starting analysis for job: {job['title']} at {job['company']}")
+        with ANALYSIS_CACHE_LOCK:
+            return get_analysis_cache().execute(
+                "SELECT match_score, match_reasoning FROM analyses WHERE key = ? AND created > ?",
+                (key, time.time() - ANALYSIS_CACHE_TTL)
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Analysis cache unavailable: {e}")
+        return None
+
+def store_cached_analysis(key: str, match_score: int, match_reasoning: str) -> None:
+    """Cache an analysis"""
+    try:
+        with ANALYSIS_CACHE_LOCK:
+            conn = get_analysis_cache()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?)",
+                    (key, time.time(), match_score, match_reasoning)
+                )
+    except sqlite3.Error as e:
+        logger.warning(f"Could not cache analysis: {e}")
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the token count of a prompt from its length"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def truncate_to_tokens(text: str, max_tokens: int, label: str) -> str:
+    """Cut text to roughly max_tokens tokens, at a word boundary where possible"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    logger.info(f"Truncating {label} from ~{estimate_tokens(text)} to {max_tokens} tokens")
+    truncated = text[:max_chars]
+    return truncated.rsplit(None, 1)[0]
+
+def is_retryable(error: BaseException) -> bool:
+    """Connection failures, rate limits and transient server errors are worth retrying"""
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+def retry_delay(retry_state: RetryCallState) -> float:
+    """Wait as long as the server's Retry-After header asks, or back off exponentially with jitter"""
+    error = retry_state.outcome.exception()
+    if isinstance(error, anthropic.APIStatusError):
+        retry_after = parse_retry_after(error.response.headers.get('retry-after'))
+        if retry_after:
+            return retry_after
+    return BACKOFF_WAIT(retry_state)
+
+def before_retry(retry_state: RetryCallState) -> None:
+    """Log the retry; on a rate limit, hold back every other request until it resets as well"""
+    delay = retry_state.next_action.sleep
+    error = retry_state.outcome.exception()
+    if isinstance(error, anthropic.RateLimitError):
+        REQUEST_BUCKET.pause(delay)
+        INPUT_TOKEN_BUCKET.pause(delay)
+    logger.info(f"{type(error).__name__} from Claude, waiting for {delay:.1f} seconds before retry...")
+
+def set_match(job: JobRecord, match_score: int, match_reasoning: str) -> JobRecord:
+    """Record an analysis on the job itself rather than on a copy"""
+    job.match_score = match_score
+    job.match_reasoning = match_reasoning
+    return job
+
+def job_description_text(job: JobRecord) -> str:
+    """Description to show Claude; jobs may be scored before their full description has been fetched"""
+    if not job.description:
+        return f"Not available yet. Location: {job.location}"
+    return truncate_to_tokens(job.description, DESCRIPTION_TOKEN_BUDGET, f"description of {job.title}")
+
+@dataclass(slots=True)
+class PromptPrefix:
+    """The job-independent parts of every request in an analysis run, built once per run"""
+    model: str
+    resume_block: Dict
+    cache_digest: Any
+
+def build_prompt_prefix(resume_text: str, model: str) -> PromptPrefix:
+    """
+    Truncate the resume and build its prompt block and cache-key hash.
+    The block comes first in every prompt. When it is long enough for the model
+    to cache, it is marked for prompt caching so requests for the same resume
+    reuse it as a cached prefix; shorter blocks are sent uncached.
+    """
+    resume_text = truncate_to_tokens(resume_text, RESUME_TOKEN_BUDGET, "resume")
+    resume_block = {
+        "type": "text",
+        "text": f"Candidate resume to match against job postings.\n\nRESUME:\n{resume_text}"
+    }
+    if estimate_tokens(resume_block["text"]) >= MIN_CACHEABLE_TOKENS.get(model, 1024):
+        resume_block["cache_control"] = {"type": "ephemeral"}
+    return PromptPrefix(
+        model=model,
+        resume_block=resume_block,
+        cache_digest=update_digest(hashlib.sha256(), model, resume_text)
+    )
+
+@retry(
+    retry=retry_if_exception(is_retryable),
+    wait=retry_delay,
+    stop=stop_after_attempt(MAX_REQUEST_ATTEMPTS),
+    before_sleep=before_retry,
+    reraise=True
+)
+async def request_completion(client: anthropic.AsyncAnthropic, semaphore: asyncio.Semaphore, content: List[Dict],
+                             model: str, max_tokens: int, stop_sequences: Optional[List[str]] = None) -> str:
+    """Send prompt content blocks at the shared pace and return the reply text; retryable errors are retried"""
+    # Only the request itself holds a slot, so backing off frees it for other jobs
+    async with semaphore:
+        await REQUEST_BUCKET.acquire()
+        await INPUT_TOKEN_BUCKET.acquire(sum(estimate_tokens(block["text"]) for block in content))
+        response = await client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=[{
+                "role": "user", 
+                "content": content
+            }],
+            temperature=0,
+            stop_sequences=stop_sequences or anthropic.NOT_GIVEN
+        )
+    # A reply cut short by a stop sequence can come back with no content at all
+    if not response.content:
+        return ''
+    return response.content[0].text.strip()
+
+async def analyze_job_match(prefix: PromptPrefix, job: JobRecord, client: anthropic.AsyncAnthropic,
+                            semaphore: asyncio.Semaphore) -> JobRecord:
+    """Helper function to analyze a single job match; the semaphore bounds concurrent requests"""
+    try:
+        logger.info(f"Starting analysis for job: {job.title} at {job.company}")
         
-        # Initial delay before any API call
-        time.sleep(random.uniform(5, 10))  # Increased initial delay
+        cache_key = analysis_cache_key(prefix, job)
+        # sqlite calls run on a worker thread so a busy database never stalls the event loop
+        cached = await asyncio.to_thread(load_cached_analysis, cache_key)
+        if cached:
+            logger.info("Reusing cached analysis")
+            return set_match(job, cached[0], cached[1])
+        
+        description = job_description_text(job)
         
         # Log truncated description for debugging
-        desc_preview = job['description'][:200] + "..." if len(job['description']) > 200 else job['description']
+        desc_preview = description[:200] + "..." if len(description) > 200 else description
         logger.info(f"Job description preview: {desc_preview}")
         
         # Construct more concise prompt
-        prompt = f"""Rate this job match between 0-100 based on how well the candidate's resume matches the job requirements.
+        prompt = f"""Rate this job match between 0-100 based on how well the candidate's resume above matches the job requirements.
 
         JOB:
-        Title: {job['title']}
-        Company: {job['company']}
-        Description: {job['description']}
-
-        RESUME:
-        {resume_text}
+        Title: {job.title}
+        Company: {job.company}
+        Description: {description}
 
         Respond ONLY in this exact format:
         [Score]|[2-3 key reasons for the score]
@@ -57,30 +301,13 @@ def analyze_job_match(resume_text: str, job: Dict, client, retry_count: int = 0)
         """
 
         logger.info("Sending request to Claude API...")
-        
-        try:
-            response = client.messages.create(
-                model="claude-3-opus-20240229",
-                max_tokens=1000,
-                messages=[{
-                    "role": "user", 
-                    "content": prompt
-                }],
-                temperature=0.5
-            )
-            
-            time.sleep(5)  # Wait after successful API call
-            
-        except anthropic.RateLimitError:
-            if retry_count < max_retries:
-                retry_count += 1
-                wait_with_backoff(retry_count)
-                return analyze_job_match(resume_text, job, client, retry_count)
-            else:
-                raise Exception(f"Rate limit exceeded after {max_retries} retries")
+        content = [prefix.resume_block, {"type": "text", "text": prompt}]
+        # The reply is a single line, so generation stops at the first line break
+        response_text = await request_completion(
+            client, semaphore, content, prefix.model, MAX_TOKENS_PER_JOB, stop_sequences=["\n"]
+        )
 
         logger.info("Received response from Claude")
-        response_text = response.content[0].text.strip()
         logger.info(f"Raw response: {response_text}")
 
         try:
@@ -88,12 +315,12 @@ def analyze_job_match(resume_text: str, job: Dict, client, retry_count: int = 0)
                 raise ValueError("Response does not contain expected '|' separator")
                 
             score_part, reasoning = response_text.split('|', 1)
-            digits = ''.join(filter(str.isdigit, score_part))
+            score_match = SCORE_RE.search(score_part)
             
-            if not digits:
+            if not score_match:
                 raise ValueError("No digits found in score part")
                 
-            match_score = int(digits)
+            match_score = int(score_match.group())
             if match_score < 0 or match_score > 100:
                 raise ValueError(f"Score {match_score} is outside valid range 0-100")
                 
@@ -102,52 +329,164 @@ def analyze_job_match(resume_text: str, job: Dict, client, retry_count: int = 0)
                 raise ValueError("Empty reasoning")
                 
             logger.info(f"Successfully parsed - Score: {match_score}, Reasoning: {match_reasoning}")
+            await asyncio.to_thread(store_cached_analysis, cache_key, match_score, match_reasoning)
             
-            # Add analysis to job dict
-            job_with_match = job.copy()
-            job_with_match.update({
-                "match_score": match_score,
-                "match_reasoning": match_reasoning
-            })
-
-            return job_with_match
+            # Add analysis to job record
+            return set_match(job, match_score, match_reasoning)
 
         except Exception as parse_error:
             logger.error(f"Error parsing response: {parse_error}")
             logger.error(f"Problematic response: {response_text}")
-            return {**job, "match_score": 0, "match_reasoning": "Error parsing analysis results"}
+            return set_match(job, 0, "Error parsing analysis results")
 
     except Exception as e:
         logger.error(f"Error analyzing job: {str(e)}", exc_info=True)
-        return {**job, "match_score": 0, "match_reasoning": f"Error during analysis: {str(e)}"}
+        return set_match(job, 0, f"Error during analysis: {str(e)}")
 
-def analyze_matches(resume_text: str, jobs: List[Dict], progress_callback: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
-    """Uses Claude to analyze and score job matches"""
-    try:
+async def analyze_job_batch(prefix: PromptPrefix, jobs: List[JobRecord], client: anthropic.AsyncAnthropic,
+                            semaphore: asyncio.Semaphore) -> List[JobRecord]:
+    """Scores several jobs in one request; jobs missing from the reply are analyzed one by one"""
+    results = []
+    pending = []
+    for job in jobs:
+        cached = await asyncio.to_thread(load_cached_analysis, analysis_cache_key(prefix, job))
+        if cached:
+            results.append(set_match(job, cached[0], cached[1]))
+        else:
+            pending.append(job)
+
+    if len(pending) > 1:
+        logger.info(f"Starting batched analysis of {len(pending)} jobs")
+        job_sections = "\n".join(
+            f"""{index}) Title: {job.title}
+        Company: {job.company}
+        Description: {job_description_text(job)}
+"""
+            for index, job in enumerate(pending, 1)
+        )
+        prompt = f"""Rate each job match between 0-100 based on how well the candidate's resume above matches the job requirements.
+
+        JOBS:
+        {job_sections}
+
+        Respond ONLY with one line per job in this exact format:
+        [Job number]|[Score]|[2-3 key reasons for the score]
+
+        Example: "1|85|Strong product management background, healthcare industry experience, leadership skills"
+        """
+
+        try:
+            content = [prefix.resume_block, {"type": "text", "text": prompt}]
+            response_text = await request_completion(client, semaphore, content, prefix.model, MAX_TOKENS_PER_JOB * len(pending))
+        except Exception as e:
+            # request_completion has already retried what was retryable; sending each
+            # job on its own would only repeat the same failure
+            logger.error(f"Error in batched analysis: {str(e)}", exc_info=True)
+            results.extend(set_match(job, 0, f"Error during analysis: {str(e)}") for job in pending)
+            return results
+
+        logger.info(f"Raw batch response: {response_text}")
+
+        # Only jobs the reply left out or garbled are analyzed one by one
+        unmatched = []
+        parsed = {int(index): (int(score), reasoning) for index, score, reasoning in BATCH_LINE_RE.findall(response_text)}
+        for index, job in enumerate(pending, 1):
+            match_score, match_reasoning = parsed.get(index, (-1, ''))
+            if 0 <= match_score <= 100 and match_reasoning:
+                await asyncio.to_thread(store_cached_analysis, analysis_cache_key(prefix, job), match_score, match_reasoning)
+                results.append(set_match(job, match_score, match_reasoning))
+            else:
+                unmatched.append(job)
+        pending = unmatched
+
+    if pending:
+        results.extend(await asyncio.gather(*(analyze_job_match(prefix, job, client, semaphore) for job in pending)))
+    return results
+
+# Event loop on a background thread that every analysis runs on, and the client bound to it
+ANALYSIS_LOOP: Optional[asyncio.AbstractEventLoop] = None
+ANALYSIS_LOOP_LOCK = threading.Lock()
+CLIENT: Optional[anthropic.AsyncAnthropic] = None
+
+def get_analysis_loop() -> asyncio.AbstractEventLoop:
+    """
+    Start the shared analysis event loop on first use.
+    The async client's connection pool belongs to the loop it was created on,
+    so keeping one loop alive lets every run reuse the same connections.
+    """
+    global ANALYSIS_LOOP
+    with ANALYSIS_LOOP_LOCK:
+        if ANALYSIS_LOOP is None:
+            ANALYSIS_LOOP = asyncio.new_event_loop()
+            threading.Thread(target=ANALYSIS_LOOP.run_forever, name="claude-analysis", daemon=True).start()
+        return ANALYSIS_LOOP
+
+def get_client() -> anthropic.AsyncAnthropic:
+    """Return the shared Claude client; only called from the analysis loop"""
+    global CLIENT
+    if CLIENT is None:
         anthropic_key = os.getenv('ANTHROPIC_API_KEY')
         if not anthropic_key:
             raise ValueError('ANTHROPIC_API_KEY environment variable must be set')
+        # Retries are handled by request_completion, so the SDK's own are turned off
+        CLIENT = anthropic.AsyncAnthropic(api_key=anthropic_key, max_retries=0)
+    return CLIENT
 
-        client = anthropic.Anthropic(api_key=anthropic_key)
-        logger.info(f"Starting analysis of {len(jobs)} jobs")
-        matched_jobs = []
+async def analyze_matches_async(resume_text: str, jobs: List[JobRecord],
+                                progress_callback: Optional[Callable[[JobRecord], None]] = None,
+                                max_concurrency: int = MAX_CONCURRENT_ANALYSES,
+                                model: str = SCORING_MODEL, top_k: Optional[int] = None) -> List[JobRecord]:
+    """
+    Scores jobs concurrently, reporting each one as soon as its analysis finishes.
+    Returns the jobs best match first, only the top_k best when it is given;
+    progress_callback still sees every job.
+    """
+    client = get_client()
+    logger.info(f"Starting analysis of {len(jobs)} jobs")
+    # Everything about the resume is prepared once here rather than for every job
+    prefix = build_prompt_prefix(resume_text, model)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    matched_jobs = []
 
-        for index, job in enumerate(jobs, 1):
-            logger.info(f"Processing job {index}/{len(jobs)}")
-            job_with_match = analyze_job_match(resume_text, job, client)
+    job_iter = iter(jobs)
+    chunks = iter(lambda: list(itertools.islice(job_iter, JOBS_PER_REQUEST)), [])
+    tasks = [analyze_job_batch(prefix, chunk, client, semaphore) for chunk in chunks]
+    for task in asyncio.as_completed(tasks):
+        for job_with_match in await task:
             matched_jobs.append(job_with_match)
-            
+            logger.info(f"Finished job {len(matched_jobs)}/{len(jobs)}")
+
             if progress_callback:
                 progress_callback(job_with_match)
 
-            # Add delay between jobs
-            time.sleep(random.uniform(10, 15))
+    # Sort by match score, keeping only the best ones when asked to
+    if top_k:
+        return heapq.nlargest(top_k, matched_jobs, key=lambda x: x.match_score)
+    matched_jobs.sort(key=lambda x: x.match_score, reverse=True)
+    return matched_jobs
 
-        # Sort by match score
-        matched_jobs.sort(key=lambda x: x.get('match_score', 0), reverse=True)
-        return matched_jobs
+def analyze_matches(resume_text: str, jobs: List[JobRecord], progress_callback: Optional[Callable[[JobRecord], None]] = None,
+                    use_opus: bool = False, top_k: Optional[int] = None) -> List[JobRecord]:
+    """
+    Uses Claude to analyze and score job matches in place; use_opus trades speed and cost for quality.
+    With top_k only that many best matches are returned, though every job is still scored and reported.
+    """
+    try:
+        model = OPUS_SCORING_MODEL if use_opus else SCORING_MODEL
+
+        # Results are handed back through a queue so the callback runs on the caller's thread
+        finished = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            analyze_matches_async(resume_text, jobs, finished.put, model=model, top_k=top_k),
+            get_analysis_loop()
+        )
+        future.add_done_callback(lambda _: finished.put(None))
+        for job_with_match in iter(finished.get, None):
+            if progress_callback:
+                progress_callback(job_with_match)
+        return future.result()
 
     except Exception as e:
         logger.error("Error in analyze_matches:", exc_info=True)
         # Return original jobs with zero scores on error
-        return [{**job, "match_score": 0, "match_reasoning": "Analysis failed"} for job in jobs]
\ No newline at end of file
+        return [set_match(job, 0, "Analysis failed") for job in jobs[:top_k]]
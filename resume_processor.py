@@ -1,23 +1,30 @@
-import PyPDF2
-from io import BytesIO
+import pypdfium2 as pdfium
 
 def extract_resume_text(uploaded_file) -> str:
     """
     Extracts text content from uploaded PDF resume
     """
     try:
-        # Read PDF file
-        pdf_reader = PyPDF2.PdfReader(BytesIO(uploaded_file.read()))
-        
+        # Read PDF file; getvalue() hands over the upload's buffer whatever the current read position
+        data = uploaded_file.getvalue() if hasattr(uploaded_file, "getvalue") else uploaded_file.read()
+        pdf = pdfium.PdfDocument(data)
+
         # Extract text from all pages
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        
-        # Basic cleanup
-        text = text.replace('\n\n', '\n').strip()
-        
+        try:
+            page_texts = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                page_texts.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+        text = "\n".join(page_texts)
+
+        # Basic cleanup; PDFium ends lines with \r\n
+        text = text.replace('\r\n', '\n').replace('\n\n', '\n').strip()
+
         return text
-    
+
     except Exception as e:
         raise Exception(f"Error processing resume: {str(e)}")
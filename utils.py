@@ -1,7 +1,42 @@
-import pandas as pd
+import csv
 import io
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
 
-def export_to_csv(matches_df: pd.DataFrame) -> str:
+@dataclass(slots=True)
+class JobRecord:
+    """A scraped job posting, plus its match analysis once scored"""
+    title: str
+    company: str
+    location: str
+    description: Optional[str]
+    posted_date: datetime
+    url: Optional[str]
+    match_score: int = 0
+    match_reasoning: str = ''
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """Return the delay requested by a Retry-After header in seconds, or 0"""
+    if not value:
+        return 0.0
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def format_posted_date(posted_date: datetime) -> str:
+    """
+    Formats a job's posted date for display and export
+    """
+    return posted_date.strftime("%Y-%m-%d %H:%M:%S")
+
+def export_to_csv(matches: List[JobRecord]) -> str:
     """
     Exports matched jobs to CSV format
     """
@@ -11,7 +46,13 @@ def export_to_csv(matches_df: pd.DataFrame) -> str:
         'match_score', 'match_reasoning'
     ]
     
-    # Create CSV in memory
+    # Write CSV rows straight from the job records
     output = io.StringIO()
-    matches_df[export_columns].to_csv(output, index=False)
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(export_columns)
+    writer.writerows(
+        (job.title, job.company, job.location, format_posted_date(job.posted_date),
+         job.match_score, job.match_reasoning)
+        for job in matches
+    )
     return output.getvalue()